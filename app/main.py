@@ -1,13 +1,98 @@
 
-from flask import Flask, render_template, request, redirect, url_for, abort, session, flash
+from flask import Flask, render_template, request, redirect, url_for, abort, session, flash, Response
+import click
+import contextlib
+import fcntl
+import hashlib
+import heapq
 import json
+import math
 import os
 import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 
 app = Flask(__name__)
 app.secret_key = os.urandom(24)
 
-DATA_FILE = 'data.json'
+DATA_FILE = os.environ.get('DATA_FILE', 'data.json')
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', 'snapshots')
+# Where data lived before DATA_FILE was configurable; migrated on startup.
+LEGACY_DATA_FILE = os.environ.get('LEGACY_DATA_FILE', 'data.json')
+# Seconds an idle event stream waits before sending a keepalive comment.
+EVENTS_KEEPALIVE = 15
+# Seconds before an event stream ends; EventSource reconnects after
+# EVENTS_RETRY_MS and resumes from Last-Event-ID.
+EVENTS_STREAM_SECONDS = 60
+EVENTS_RETRY_MS = 3000
+# Minimum seconds between checks of DATA_FILE for writes made by another
+# process, shared by every watcher.
+STORAGE_CHECK_INTERVAL = 1
+# Seconds between attempts to take the snapshot lock.
+SNAPSHOT_LOCK_POLL = 0.05
+
+def storage_version():
+    # save_data() renames a new file into place, so the inode and mtime change
+    # on every write, whichever process made it.
+    try:
+        st = os.stat(DATA_FILE)
+    except FileNotFoundError:
+        return '0'
+    return f'{st.st_ino}-{st.st_mtime_ns}'
+
+class ChangeHub:
+    """Fans out storage changes to every open event stream.
+
+    The version is the storage version of DATA_FILE. save_data() publishes
+    the saved data once; writes from other processes are picked up by at most
+    one storage check per STORAGE_CHECK_INTERVAL. Each watcher blocks on the
+    shared condition instead of polling storage.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._version = None
+        self._data = None
+        self._checked = 0
+
+    def publish(self, data):
+        with self._cond:
+            self._version = storage_version()
+            self._data = data
+            self._checked = time.monotonic()
+            self._cond.notify_all()
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._data is not None and now - self._checked < STORAGE_CHECK_INTERVAL:
+            return
+        self._checked = now
+        version = storage_version()
+        if version != self._version or self._data is None:
+            self._version = version
+            self._data = get_data()
+            self._cond.notify_all()
+
+    def snapshot(self):
+        with self._cond:
+            self._refresh()
+            return self._version, self._data
+
+    def wait(self, since, timeout):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._version == since:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(min(remaining, STORAGE_CHECK_INTERVAL))
+                self._refresh()
+            return self._version, self._data
+
+change_hub = ChangeHub()
 
 def get_data():
     if not os.path.exists(DATA_FILE):
@@ -15,9 +100,174 @@ def get_data():
     with open(DATA_FILE, 'r') as f:
         return json.load(f)
 
+def write_json_temp(path, data):
+    """Writes ``data`` to a complete, synced temp file next to ``path``."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates the file private to the owner; keep the usual mode.
+        os.chmod(tmp_path, 0o644)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return tmp_path
+
+def write_json_atomic(path, data):
+    # Write to a sibling temp file and rename it over the target so readers
+    # and snapshots only ever see a complete file.
+    tmp_path = write_json_temp(path, data)
+    try:
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
 def save_data(data):
-    with open(DATA_FILE, 'w') as f:
-        json.dump(data, f, indent=4)
+    write_json_atomic(DATA_FILE, data)
+    change_hub.publish(data)
+
+def migrate_legacy_data():
+    # Copy the legacy file into place instead of silently starting empty when
+    # DATA_FILE moved. An existing DATA_FILE always wins.
+    if os.path.exists(DATA_FILE) or not os.path.isfile(LEGACY_DATA_FILE):
+        return
+    if os.path.abspath(DATA_FILE) == os.path.abspath(LEGACY_DATA_FILE):
+        return
+    with open(LEGACY_DATA_FILE, 'r') as f:
+        data = json.load(f)
+    os.makedirs(os.path.dirname(os.path.abspath(DATA_FILE)), exist_ok=True)
+    write_json_atomic(DATA_FILE, data)
+    app.logger.warning('Migrated %d page(s) from %s to %s', len(data), LEGACY_DATA_FILE, DATA_FILE)
+
+migrate_legacy_data()
+
+@contextlib.contextmanager
+def snapshot_lock():
+    # flock on a file of its own serialises snapshots and restores across
+    # processes (the CLI and the server) without blocking save_data().
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    with open(os.path.join(SNAPSHOT_DIR, '.lock'), 'w') as f:
+        # Poll instead of blocking in flock: time.sleep yields to other
+        # greenlets under gevent, a blocking flock would stall the worker.
+        while True:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                time.sleep(SNAPSHOT_LOCK_POLL)
+        yield
+
+def page_hash(page):
+    return hashlib.sha256(json.dumps(page, sort_keys=True).encode()).hexdigest()
+
+def snapshot_path(version):
+    return os.path.join(SNAPSHOT_DIR, f'snapshot-{version:06d}.json')
+
+def list_snapshots():
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return []
+    versions = []
+    for name in os.listdir(SNAPSHOT_DIR):
+        match = re.fullmatch(r'snapshot-(\d+)\.json', name)
+        # Skip empty files, e.g. left behind by an interrupted older release.
+        if match and os.path.getsize(os.path.join(SNAPSHOT_DIR, name)) > 0:
+            versions.append(int(match.group(1)))
+    return sorted(versions)
+
+def load_snapshot(version):
+    with open(snapshot_path(version), 'r') as f:
+        return json.load(f)
+
+def latest_snapshot():
+    # The newest snapshot that can be read; unreadable files are ignored so
+    # one damaged file does not block every later snapshot.
+    for version in reversed(list_snapshots()):
+        try:
+            return load_snapshot(version)
+        except (OSError, ValueError):
+            continue
+    return None
+
+def next_snapshot_version():
+    # Counts every snapshot file, readable or not, so a new snapshot never
+    # reuses a name.
+    versions = [int(m.group(1)) for m in
+                (re.fullmatch(r'snapshot-(\d+)\.json', name) for name in os.listdir(SNAPSHOT_DIR)) if m]
+    return max(versions, default=0) + 1
+
+def create_snapshot(full=False):
+    """Writes a point-in-time snapshot of DATA_FILE and returns it.
+
+    save_data() replaces DATA_FILE atomically, so reading it needs no lock
+    shared with submit(). Unless ``full`` is set, the snapshot only stores
+    pages whose content changed since the previous snapshot, plus the ids of
+    deleted pages; ``base`` names the snapshot it builds on.
+    """
+    with snapshot_lock():
+        data = get_data()
+        hashes = {page_id: page_hash(page) for page_id, page in data.items()}
+        previous = latest_snapshot()
+        if full or previous is None:
+            base = None
+            pages = data
+            deleted = []
+        else:
+            base = previous['version']
+            pages = {page_id: page for page_id, page in data.items()
+                     if previous['hashes'].get(page_id) != hashes[page_id]}
+            deleted = [page_id for page_id in previous['hashes'] if page_id not in data]
+        snapshot = {
+            'version': next_snapshot_version(),
+            'base': base,
+            'created': time.time(),
+            'pages': pages,
+            'deleted': deleted,
+            'hashes': hashes,
+        }
+        # Only complete files get a snapshot name: the snapshot is written to
+        # a temp file and then linked into place, which fails rather than
+        # overwriting if the name is already taken.
+        while True:
+            path = snapshot_path(snapshot['version'])
+            tmp_path = write_json_temp(path, snapshot)
+            try:
+                os.link(tmp_path, path)
+                break
+            except FileExistsError:
+                snapshot['version'] += 1
+            finally:
+                os.unlink(tmp_path)
+    return snapshot
+
+class SnapshotMissing(Exception):
+    def __init__(self, version):
+        super().__init__(f'Snapshot {version} is missing')
+        self.version = version
+
+def restore_snapshot(version):
+    """Rebuilds the data as of snapshot ``version`` and saves it."""
+    chain = []
+    with snapshot_lock():
+        while version is not None:
+            try:
+                snapshot = load_snapshot(version)
+            except FileNotFoundError:
+                raise SnapshotMissing(version)
+            chain.append(snapshot)
+            version = snapshot['base']
+    data = {}
+    for snapshot in reversed(chain):
+        for page_id in snapshot['deleted']:
+            data.pop(page_id, None)
+        data.update(snapshot['pages'])
+    save_data(data)
+    return data
+
+def page_state(page):
+    return {'count': len(page['users']), 'closed': page['closed']}
 
 def slugify(s):
     s = s.lower().strip()
@@ -57,6 +307,14 @@ def admin():
         cap_type = request.form.get('cap_type')
         group_size = int(request.form.get('group_size'))
         variation = int(request.form.get('variation', 0))
+        solver = request.form.get('solver', 'auto')
+        if solver != 'auto':
+            if solver not in SOLVERS:
+                flash(f'Unknown solver {solver}')
+                return redirect(url_for('admin'))
+            if cap_type not in SOLVERS[solver]['cap_types']:
+                flash(f'{solver} does not support {cap_type} caps')
+                return redirect(url_for('admin'))
 
         if page_name and projects:
             data = get_data()
@@ -73,11 +331,31 @@ def admin():
                 'closed': False,
                 'cap_type': cap_type,
                 'group_size': group_size,
-                'variation': variation
+                'variation': variation,
+                'solver': solver
             }
             save_data(data)
             return redirect(url_for('admin'))
-    return render_template('admin.html', pages=get_data())
+    return render_template('admin.html', pages=get_data(), solvers=SOLVERS)
+
+@app.route('/admin/snapshot', methods=['POST'])
+def snapshot():
+    if 'logged_in' not in session:
+        return redirect(url_for('login'))
+    # Reading, hashing and writing every page grows with the data, so run the
+    # snapshot command in a child process; waiting on it yields under gevent
+    # and submit() keeps being served.
+    args = [sys.executable, '-m', 'flask', '--app', 'app.main', 'snapshot']
+    if request.form.get('full'):
+        args.append('--full')
+    env = dict(os.environ, DATA_FILE=DATA_FILE, SNAPSHOT_DIR=SNAPSHOT_DIR, LEGACY_DATA_FILE=LEGACY_DATA_FILE)
+    result = subprocess.run(args, capture_output=True, text=True, env=env)
+    if result.returncode == 0:
+        flash(result.stdout.strip())
+    else:
+        errors = result.stderr.strip().splitlines()
+        flash(f"Snapshot failed: {errors[-1] if errors else f'exit code {result.returncode}'}")
+    return redirect(url_for('admin'))
 
 @app.route('/admin/delete/<page_id>', methods=['POST'])
 def delete_page(page_id):
@@ -97,6 +375,38 @@ def choice(page_id):
         abort(404)
     return render_template('choice.html', page=page, page_id=page_id)
 
+@app.route('/<page_id>/events')
+def events(page_id):
+    version, data = change_hub.snapshot()
+    if page_id not in data:
+        abort(404)
+    last_event_id = request.headers.get('Last-Event-ID')
+
+    def stream():
+        nonlocal version, data
+        yield f'retry: {EVENTS_RETRY_MS}\n\n'
+        # A reconnecting client already has the state of the version it saw.
+        last_state = page_state(data[page_id]) if version == last_event_id else None
+        deadline = time.monotonic() + EVENTS_STREAM_SECONDS
+        while True:
+            page = data.get(page_id)
+            if page is None:
+                yield 'event: deleted\ndata: {}\n\n'
+                return
+            state = page_state(page)
+            if state != last_state:
+                last_state = state
+                yield f'id: {version}\ndata: {json.dumps(state)}\n\n'
+            else:
+                yield ': keepalive\n\n'
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            version, data = change_hub.wait(version, timeout=min(EVENTS_KEEPALIVE, remaining))
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/<page_id>/submit', methods=['POST'])
 def submit(page_id):
     data = get_data()
@@ -151,6 +461,216 @@ def results(page_id):
     
     return render_template('results.html', page=page)
 
+# Wall-clock seconds the exact solver may spend before auto mode prefers a
+# heuristic, and the hard deadline after which a running exact solve gives up.
+SOLVER_TIME_BUDGET = 2.0
+
+SOLVERS = {}
+
+class SolverTimeout(Exception):
+    pass
+
+def register_solver(name, cap_types, cost, exact=False, time_budget=False, needs_slack=()):
+    """Registers an assignment engine under ``name``.
+
+    ``cap_types`` lists the cap types the engine honours, ``exact`` marks
+    engines that return an optimal assignment, ``time_budget`` marks engines
+    that accept a deadline and raise SolverTimeout when it passes, and
+    ``needs_slack`` lists the cap types for which the engine can only run when
+    every user fits under the group capacity. ``cost(num_users, num_projects, capacity)`` estimates
+    the run time in seconds and drives auto selection.
+    """
+    def decorator(solve):
+        SOLVERS[name] = {
+            'name': name,
+            'solve': solve,
+            'cap_types': set(cap_types),
+            'exact': exact,
+            'time_budget': time_budget,
+            'needs_slack': set(needs_slack),
+            'cost': cost,
+        }
+        return solve
+    return decorator
+
+def solver_supports(solver, cap_type, slack):
+    return solver_unsupported_reason(solver, cap_type, slack) is None
+
+def solver_unsupported_reason(solver, cap_type, slack):
+    if cap_type not in solver['cap_types']:
+        return f"{solver['name']} does not support {cap_type} caps"
+    if slack < 0 and cap_type in solver['needs_slack']:
+        return f"{solver['name']} needs room for every user under {cap_type} caps"
+    return None
+
+def select_solver(cap_type, num_users, num_projects, capacity):
+    slack = num_projects * capacity - num_users
+    candidates = [s for s in SOLVERS.values() if solver_supports(s, cap_type, slack)]
+    if not candidates:
+        raise ValueError(f'No registered solver supports {cap_type} caps')
+    estimates = {s['name']: s['cost'](num_users, num_projects, capacity) for s in candidates}
+    exact = [s for s in candidates if s['exact'] and estimates[s['name']] <= SOLVER_TIME_BUDGET]
+    if exact:
+        chosen = min(exact, key=lambda s: estimates[s['name']])
+    else:
+        chosen = min(candidates, key=lambda s: estimates[s['name']])
+    return chosen, estimates[chosen['name']]
+
+# Per-operation constants fitted with benchmarks/solvers.py; see the docstring
+# there for how to recalibrate them on new hardware.
+GREEDY_SECONDS_PER_OP = 1.4e-07
+EXACT_SECONDS_PER_OP = 7.8e-08
+
+def greedy_cost(num_users, num_projects, capacity):
+    return GREEDY_SECONDS_PER_OP * num_users * num_projects * num_projects
+
+def exact_cost(num_users, num_projects, capacity):
+    augmentations = min(num_users, num_projects * capacity)
+    edges = num_users * num_projects + num_users + num_projects
+    return EXACT_SECONDS_PER_OP * augmentations * edges * math.log2(num_users + num_projects + 2)
+
+def sorted_preferences(users):
+    user_preferences = []
+    for user_name, preferences in users.items():
+        sorted_prefs = sorted(preferences.items(), key=lambda item: item[1])
+        user_preferences.append({'name': user_name, 'prefs': sorted_prefs})
+    return user_preferences
+
+@register_solver('greedy-hard', cap_types=['hard'], cost=greedy_cost)
+def solve_greedy_hard(users, projects, capacity, deadline=None):
+    groups = {project: [] for project in projects}
+    assigned_users = set()
+    user_preferences = sorted_preferences(users)
+
+    for preference_level in range(1, len(projects) + 1):
+        for user in user_preferences:
+            if user['name'] in assigned_users:
+                continue
+            for project, pref_value in user['prefs']:
+                if pref_value == preference_level:
+                    if len(groups[project]) < capacity:
+                        groups[project].append(user['name'])
+                        assigned_users.add(user['name'])
+                        break
+
+    # Assign remaining users to any group that is not full
+    remaining_users = [user for user in user_preferences if user['name'] not in assigned_users]
+    for user in remaining_users:
+        for project in projects:
+            if len(groups[project]) < capacity:
+                groups[project].append(user['name'])
+                assigned_users.add(user['name'])
+                break
+
+    return groups
+
+@register_solver('greedy-soft', cap_types=['soft'], cost=greedy_cost)
+def solve_greedy_soft(users, projects, capacity, deadline=None):
+    groups = {project: [] for project in projects}
+    assigned_users = set()
+    user_preferences = sorted_preferences(users)
+
+    # First pass: assign users to their preferred groups if not full
+    for preference_level in range(1, len(projects) + 1):
+        for user in user_preferences:
+            if user['name'] in assigned_users:
+                continue
+            for project, pref_value in user['prefs']:
+                if pref_value == preference_level:
+                    if len(groups[project]) < capacity:
+                        groups[project].append(user['name'])
+                        assigned_users.add(user['name'])
+                        break
+
+    # Assign remaining users, prioritizing smaller groups
+    remaining_users = [user for user in user_preferences if user['name'] not in assigned_users]
+    for user in remaining_users:
+        # Find the smallest group that is not full
+        available_groups = {p: len(g) for p, g in groups.items() if len(g) < capacity}
+        if not available_groups:
+            # If all groups are full, just add to the smallest one (should not happen if capacity is reasonable)
+            smallest_group = min(groups, key=lambda k: len(groups[k]))
+        else:
+            smallest_group = min(available_groups, key=available_groups.get)
+
+        groups[smallest_group].append(user['name'])
+        assigned_users.add(user['name'])
+
+    return groups
+
+@register_solver('exact', cap_types=['hard', 'soft'], cost=exact_cost, exact=True, time_budget=True,
+                 needs_slack=['soft'])
+def solve_exact(users, projects, capacity, deadline=None):
+    """Assigns as many users as capacity allows with the lowest total rank.
+
+    Runs successive shortest paths on the users -> projects -> sink flow
+    network, using Dijkstra with potentials. Unranked projects cost one more
+    than the worst rank.
+    """
+    names = list(users)
+    num_users = len(names)
+    num_projects = len(projects)
+    missing = num_projects + 1
+    sink = num_users + num_projects
+    # cost[u][p] for user u and project p, shifted so the smallest is zero;
+    # residual flow is tracked by assignment[u] (project index or None) and
+    # load[p].
+    cost = [[users[name].get(project, missing) for project in projects] for name in names]
+    lowest = min((min(row) for row in cost), default=0)
+    cost = [[c - lowest for c in row] for row in cost]
+    assignment = [None] * num_users
+    load = [0] * num_projects
+    potential = [0] * (sink + 1)
+
+    while True:
+        if deadline is not None and time.monotonic() > deadline:
+            raise SolverTimeout()
+        # Shortest path from any unassigned user to the sink through free
+        # project capacity, possibly moving already placed users on the way.
+        dist = [math.inf] * (sink + 1)
+        prev = [None] * (sink + 1)
+        heap = []
+        for user in range(num_users):
+            if assignment[user] is None:
+                dist[user] = 0
+                heap.append((0, user))
+        while heap:
+            d, node = heapq.heappop(heap)
+            if d > dist[node]:
+                continue
+            if node < num_users:
+                edges = [(num_users + p, cost[node][p]) for p in range(num_projects) if p != assignment[node]]
+            elif node < sink:
+                p = node - num_users
+                edges = [(u, -cost[u][p]) for u in range(num_users) if assignment[u] == p]
+                if load[p] < capacity:
+                    edges.append((sink, 0))
+            else:
+                continue
+            for target, weight in edges:
+                nd = d + weight + potential[node] - potential[target]
+                if nd < dist[target]:
+                    dist[target] = nd
+                    prev[target] = node
+                    heapq.heappush(heap, (nd, target))
+        if dist[sink] == math.inf:
+            break
+        for node in range(sink + 1):
+            if dist[node] < math.inf:
+                potential[node] += dist[node]
+        node = prev[sink]
+        load[node - num_users] += 1
+        while node is not None:
+            user = prev[node]
+            assignment[user] = node - num_users
+            node = prev[user]
+
+    groups = {project: [] for project in projects}
+    for user, p in enumerate(assignment):
+        if p is not None:
+            groups[projects[p]].append(names[user])
+    return groups
+
 def assign_groups(page):
     users = page['users']
     projects = page['projects']
@@ -160,7 +680,9 @@ def assign_groups(page):
     if num_projects == 0:
         page['groups'] = {}
         return
-    cap_type = page.get('cap_type', 'soft')
+    # Anything other than a hard cap is treated as soft, as before solvers
+    # were pluggable.
+    cap_type = 'hard' if page.get('cap_type') == 'hard' else 'soft'
     group_size = page.get('group_size', num_users // num_projects if num_projects > 0 else 1)
     # Variation is expected to be a positive number. Using abs() to handle negative inputs gracefully.
     variation = abs(page.get('variation', 0))
@@ -169,67 +691,63 @@ def assign_groups(page):
         page['groups'] = {project: [] for project in projects}
         return
 
-    groups = {project: [] for project in projects}
-    assigned_users = set()
+    capacity = group_size if cap_type == 'hard' else group_size + variation
+    slack = num_projects * capacity - num_users
+    requested = page.get('solver', 'auto')
+    run = {'mode': requested}
+    solver = SOLVERS.get(requested)
+    if requested != 'auto':
+        if solver is None:
+            reason = f'unknown solver {requested}'
+        else:
+            reason = solver_unsupported_reason(solver, cap_type, slack)
+        if reason is not None:
+            # A pinned engine can stop fitting, e.g. once submissions outgrow
+            # a soft cap; record that auto selection was used instead.
+            run = {'mode': 'auto', 'requested': requested, 'override': reason}
+            solver = None
+    if solver is not None:
+        estimate = solver['cost'](num_users, num_projects, capacity)
+    else:
+        solver, estimate = select_solver(cap_type, num_users, num_projects, capacity)
 
-    user_preferences = []
-    for user_name, preferences in users.items():
-        sorted_prefs = sorted(preferences.items(), key=lambda item: item[1])
-        user_preferences.append({'name': user_name, 'prefs': sorted_prefs})
+    run.update(engine=solver['name'], estimate=estimate)
+    start = time.monotonic()
+    deadline = start + SOLVER_TIME_BUDGET if solver['time_budget'] else None
+    try:
+        groups = solver['solve'](users, projects, capacity, deadline=deadline)
+    except SolverTimeout:
+        solver = min((s for s in SOLVERS.values() if solver_supports(s, cap_type, slack) and not s['time_budget']),
+                     key=lambda s: s['cost'](num_users, num_projects, capacity))
+        run['fallback'] = solver['name']
+        groups = solver['solve'](users, projects, capacity)
+    run['seconds'] = time.monotonic() - start
 
-    if cap_type == 'hard':
-        # Hard cap logic
-        for preference_level in range(1, num_projects + 1):
-            for user in user_preferences:
-                if user['name'] in assigned_users:
-                    continue
-                for project, pref_value in user['prefs']:
-                    if pref_value == preference_level:
-                        if len(groups[project]) < group_size:
-                            groups[project].append(user['name'])
-                            assigned_users.add(user['name'])
-                            break
-        
-        # Assign remaining users to any group that is not full
-        remaining_users = [user for user in user_preferences if user['name'] not in assigned_users]
-        for user in remaining_users:
-            for project in projects:
-                if len(groups[project]) < group_size:
-                    groups[project].append(user['name'])
-                    assigned_users.add(user['name'])
-                    break
+    page['groups'] = groups
+    page['solver_run'] = run
 
-    else: # Soft cap logic
-        min_group_size = max(1, group_size - variation)
-        max_group_size = group_size + variation
-
-        # First pass: assign users to their preferred groups if not full
-        for preference_level in range(1, num_projects + 1):
-            for user in user_preferences:
-                if user['name'] in assigned_users:
-                    continue
-                for project, pref_value in user['prefs']:
-                    if pref_value == preference_level:
-                        if len(groups[project]) < max_group_size:
-                            groups[project].append(user['name'])
-                            assigned_users.add(user['name'])
-                            break
-
-        # Assign remaining users, prioritizing smaller groups
-        remaining_users = [user for user in user_preferences if user['name'] not in assigned_users]
-        for user in remaining_users:
-            # Find the smallest group that is not full
-            available_groups = {p: len(g) for p, g in groups.items() if len(g) < max_group_size}
-            if not available_groups:
-                # If all groups are full, just add to the smallest one (should not happen if max_group_size is reasonable)
-                smallest_group = min(groups, key=lambda k: len(groups[k]))
-            else:
-                smallest_group = min(available_groups, key=available_groups.get)
-            
-            groups[smallest_group].append(user['name'])
-            assigned_users.add(user['name'])
+@app.cli.command('snapshot')
+@click.option('--full', is_flag=True, help='Store every page instead of only changed ones.')
+def snapshot_command(full):
+    """Write a point-in-time snapshot of the page data."""
+    result = create_snapshot(full=full)
+    click.echo(f"Snapshot {result['version']} saved with {len(result['pages'])} changed page(s) "
+               f"and {len(result['deleted'])} deleted page(s)")
 
-    page['groups'] = groups
+@app.cli.command('restore')
+@click.argument('version', type=int, required=False)
+def restore_command(version):
+    """Restore the page data from a snapshot (the latest by default)."""
+    versions = list_snapshots()
+    if version is None and versions:
+        version = versions[-1]
+    if version not in versions:
+        raise click.ClickException('No such snapshot')
+    try:
+        data = restore_snapshot(version)
+    except SnapshotMissing as e:
+        raise click.ClickException(f'Snapshot {e.version} is missing; snapshot {version} builds on it')
+    click.echo(f'Restored {len(data)} page(s) from snapshot {version}')
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,50 @@
+"""Times every registered solver and fits the per-operation cost constants.
+
+Run from the repository root with ``python benchmarks/solvers.py`` and copy
+the printed constants into app/main.py.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import main as app_main
+
+SIZES = [(20, 4), (50, 5), (100, 10), (200, 10), (400, 20), (1000, 20)]
+CONSTANTS = {
+    'greedy-hard': 'GREEDY_SECONDS_PER_OP',
+    'greedy-soft': 'GREEDY_SECONDS_PER_OP',
+    'exact': 'EXACT_SECONDS_PER_OP',
+}
+
+def make_users(num_users, projects, rng):
+    users = {}
+    for i in range(num_users):
+        ranking = rng.sample(projects, len(projects))
+        users[f'User {i}'] = {project: rank for rank, project in enumerate(ranking, 1)}
+    return users
+
+def main():
+    rng = random.Random(0)
+    fitted = {}
+    for num_users, num_projects in SIZES:
+        projects = [f'Project {i}' for i in range(num_projects)]
+        users = make_users(num_users, projects, rng)
+        capacity = -(-num_users // num_projects) + 1
+        for name, solver in app_main.SOLVERS.items():
+            start = time.perf_counter()
+            solver['solve'](users, projects, capacity)
+            seconds = time.perf_counter() - start
+            # cost() is linear in its constant, so estimate / constant is the
+            # operation count for this size.
+            constant = getattr(app_main, CONSTANTS[name])
+            ops = solver['cost'](num_users, num_projects, capacity) / constant
+            fitted.setdefault(CONSTANTS[name], []).append(seconds / ops)
+            print(f'{name:12} U={num_users:5} P={num_projects:3} {seconds * 1000:9.2f} ms')
+    for constant, ratios in fitted.items():
+        print(f'{constant} = {max(ratios):.1e}')
+
+if __name__ == '__main__':
+    main()
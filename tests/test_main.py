@@ -1,17 +1,58 @@
 import unittest
 import sys
 import os
+import fcntl
+import json
+import tempfile
+import threading
 
 # Add the project root to the path so we can import the app module
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from app.main import assign_groups
+import app.main as main
+from app.main import assign_groups, select_solver, solve_exact, ChangeHub
+
+def make_page(name='Page', projects=('Project A',), users=None, closed=False, **options):
+    page = {'name': name, 'projects': list(projects), 'users': users or {}, 'closed': closed}
+    page.update(options)
+    return page
+
+def ranked_users(num_users, projects):
+    # Each user's ranking is the project list rotated by their index.
+    return {f'User {i}': {p: (i + j) % len(projects) + 1 for j, p in enumerate(projects)}
+            for i in range(num_users)}
+
+class StorageTestCase(unittest.TestCase):
+    """
+    Points DATA_FILE, SNAPSHOT_DIR and LEGACY_DATA_FILE at a temporary
+    directory and gives each test a fresh ChangeHub.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.saved = {name: getattr(main, name)
+                      for name in ('DATA_FILE', 'SNAPSHOT_DIR', 'LEGACY_DATA_FILE', 'change_hub')}
+        main.DATA_FILE = os.path.join(self.tmpdir.name, 'data.json')
+        main.SNAPSHOT_DIR = os.path.join(self.tmpdir.name, 'snapshots')
+        main.LEGACY_DATA_FILE = os.path.join(self.tmpdir.name, 'legacy.json')
+        main.change_hub = ChangeHub()
+
+    def tearDown(self):
+        for name, value in self.saved.items():
+            setattr(main, name, value)
+        self.tmpdir.cleanup()
 
 class TestAssignGroups(unittest.TestCase):
     """
-    Test suite for the assign_groups function.
+    Test suite for the assign_groups function, pinned to the greedy engines.
     """
 
+    def assign_greedy(self, page):
+        page['solver'] = 'greedy-hard' if page.get('cap_type') == 'hard' else 'greedy-soft'
+        assign_groups(page)
+        if 'solver_run' in page:
+            self.assertEqual(page['solver_run']['engine'], page['solver'])
+
     def test_even_distribution(self):
         """
         Tests if assign_groups can reliably produce equal size groups.
@@ -26,7 +67,7 @@ class TestAssignGroups(unittest.TestCase):
             'group_size': 10,
             'variation': 0
         }
-        assign_groups(page)
+        self.assign_greedy(page)
         groups = page['groups']
 
         for project in projects:
@@ -46,7 +87,7 @@ class TestAssignGroups(unittest.TestCase):
             'group_size': 8,
             'variation': 2
         }
-        assign_groups(page)
+        self.assign_greedy(page)
         groups = page['groups']
 
         assigned_users = set()
@@ -67,7 +108,7 @@ class TestAssignGroups(unittest.TestCase):
             'projects': projects,
             'users': users,
         }
-        assign_groups(page)
+        self.assign_greedy(page)
         groups = page['groups']
         self.assertEqual(groups, {'Project A': [], 'Project B': []})
 
@@ -81,7 +122,7 @@ class TestAssignGroups(unittest.TestCase):
             'projects': projects,
             'users': users,
         }
-        assign_groups(page)
+        self.assign_greedy(page)
         groups = page['groups']
         self.assertEqual(groups, {})
         # Also check that no users were assigned, as there are no groups.
@@ -101,7 +142,7 @@ class TestAssignGroups(unittest.TestCase):
             'projects': projects,
             'users': users,
         }
-        assign_groups(page)
+        self.assign_greedy(page)
         groups = page['groups']
         self.assertEqual(groups, {'Project A': ['User 1']})
 
@@ -115,7 +156,7 @@ class TestAssignGroups(unittest.TestCase):
             'projects': projects,
             'users': users,
         }
-        assign_groups(page)
+        self.assign_greedy(page)
         groups = page['groups']
         self.assertEqual(groups['Project A'], ['User 1'])
         self.assertEqual(groups['Project B'], [])
@@ -133,7 +174,7 @@ class TestAssignGroups(unittest.TestCase):
             'projects': projects,
             'users': users,
         }
-        assign_groups(page)
+        self.assign_greedy(page)
         groups = page['groups']
         self.assertEqual(len(groups['Project A']), 2)
         self.assertIn('User 1', groups['Project A'])
@@ -155,7 +196,7 @@ class TestAssignGroups(unittest.TestCase):
             'cap_type': 'hard',
             'group_size': 2,
         }
-        assign_groups(page)
+        self.assign_greedy(page)
         groups = page['groups']
         
         assigned_users = set()
@@ -184,7 +225,7 @@ class TestAssignGroups(unittest.TestCase):
             'cap_type': 'hard',
             'group_size': 2,
         }
-        assign_groups(page)
+        self.assign_greedy(page)
         groups = page['groups']
 
         self.assertEqual(len(groups['Project A']), 2)
@@ -213,7 +254,7 @@ class TestAssignGroups(unittest.TestCase):
             'group_size': 5,
             'variation': 1
         }
-        assign_groups(page)
+        self.assign_greedy(page)
         groups = page['groups']
         
         self.assertEqual(len(groups['Project A']), 6)
@@ -231,7 +272,7 @@ class TestAssignGroups(unittest.TestCase):
             'cap_type': 'hard',
             'group_size': 5,
         }
-        assign_groups(page)
+        self.assign_greedy(page)
         groups = page['groups']
 
         self.assertEqual(len(groups['Project A']), 5)
@@ -250,7 +291,7 @@ class TestAssignGroups(unittest.TestCase):
             'cap_type': 'hard',
             'group_size': 0,
         }
-        assign_groups(page)
+        self.assign_greedy(page)
         groups = page['groups']
         
         # The behavior for group_size=0 is that no one gets assigned in hard cap
@@ -271,7 +312,7 @@ class TestAssignGroups(unittest.TestCase):
             'group_size': 5,
             'variation': 1
         }
-        assign_groups(page)
+        self.assign_greedy(page)
         groups = page['groups']
         
         assigned_users = set()
@@ -296,7 +337,7 @@ class TestAssignGroups(unittest.TestCase):
             'group_size': 5,
             'variation': 0
         }
-        assign_groups(page)
+        self.assign_greedy(page)
         groups = page['groups']
 
         # With skewed preferences, the first group gets filled to max_group_size,
@@ -318,7 +359,7 @@ class TestAssignGroups(unittest.TestCase):
             'group_size': 2,
             'variation': 5 # min_group_size would be -3, but clamped to 1
         }
-        assign_groups(page)
+        self.assign_greedy(page)
         groups = page['groups']
         
         # max_group_size is 7. All 10 users prefer Project A.
@@ -339,7 +380,7 @@ class TestAssignGroups(unittest.TestCase):
             'group_size': 4,
             'variation': 1
         }
-        assign_groups(page)
+        self.assign_greedy(page)
         groups = page['groups']
 
         # max_group_size is 5.
@@ -362,7 +403,7 @@ class TestAssignGroups(unittest.TestCase):
             'cap_type': 'hard',
             'group_size': 1,
         }
-        assign_groups(page)
+        self.assign_greedy(page)
         groups = page['groups']
 
         for project in projects:
@@ -382,7 +423,7 @@ class TestAssignGroups(unittest.TestCase):
             'group_size': 5,
             'variation': -2
         }
-        assign_groups(page)
+        self.assign_greedy(page)
         groups = page['groups']
 
         # With abs(variation), max_group_size is 7. All 10 users prefer Project A.
@@ -404,7 +445,7 @@ class TestAssignGroups(unittest.TestCase):
             'projects': projects,
             'users': users,
         }
-        assign_groups(page)
+        self.assign_greedy(page)
         groups = page['groups']
 
         self.assertIn('User 1', groups['Project A'])
@@ -424,7 +465,7 @@ class TestAssignGroups(unittest.TestCase):
             'cap_type': 'hard',
             'group_size': 5,
         }
-        assign_groups(page_hard)
+        self.assign_greedy(page_hard)
         groups_hard = page_hard['groups']
         self.assertEqual(len(groups_hard['Project A']), 5)
         self.assertEqual(len(groups_hard['Project B']), 5)
@@ -437,7 +478,7 @@ class TestAssignGroups(unittest.TestCase):
             'group_size': 5,
             'variation': 2
         }
-        assign_groups(page_soft)
+        self.assign_greedy(page_soft)
         groups_soft = page_soft['groups']
         self.assertEqual(len(groups_soft['Project A']), 7)
         self.assertEqual(len(groups_soft['Project B']), 3)
@@ -459,7 +500,7 @@ class TestAssignGroups(unittest.TestCase):
             'cap_type': 'hard',
             'group_size': 2,
         }
-        assign_groups(page)
+        self.assign_greedy(page)
         groups = page['groups']
 
         self.assertEqual(len(groups['Project A']), 2)
@@ -469,5 +510,500 @@ class TestAssignGroups(unittest.TestCase):
         self.assertIn('User 3', groups['Project B'])
         self.assertIn('User 4', groups['Project B'])
 
+class TestSolvers(unittest.TestCase):
+    """
+    Test suite for the solver registry and automatic engine selection.
+    """
+
+    projects = [f'Project {i}' for i in range(4)]
+
+    def test_auto_picks_exact_for_small_pages(self):
+        """
+        Tests that auto mode solves small pages exactly and records the run.
+        """
+        page = make_page(projects=self.projects, users=ranked_users(20, self.projects),
+                         cap_type='hard', group_size=5)
+        assign_groups(page)
+        run = page['solver_run']
+        self.assertEqual(run['mode'], 'auto')
+        self.assertEqual(run['engine'], 'exact')
+        self.assertLess(run['estimate'], main.SOLVER_TIME_BUDGET)
+        self.assertGreaterEqual(run['seconds'], 0)
+
+    def test_auto_picks_heuristic_for_huge_pages(self):
+        """
+        Tests that the cost model routes huge pages to the greedy heuristic.
+        """
+        solver, estimate = select_solver('soft', 20000, 50, 401)
+        self.assertEqual(solver['name'], 'greedy-soft')
+        solver, estimate = select_solver('hard', 20000, 50, 400)
+        self.assertEqual(solver['name'], 'greedy-hard')
+
+    def test_auto_skips_exact_without_slack(self):
+        """
+        Tests that soft caps without room for every user keep the greedy overflow.
+        """
+        solver, estimate = select_solver('soft', 10, 2, 4)
+        self.assertEqual(solver['name'], 'greedy-soft')
+
+    def test_unknown_cap_type(self):
+        """
+        Tests that an unknown cap type is solved as a soft cap and that
+        selection reports cap types no engine supports.
+        """
+        page = make_page(projects=self.projects, users=ranked_users(20, self.projects),
+                         cap_type='banana', group_size=5)
+        assign_groups(page)
+        self.assertIn(page['solver_run']['engine'], main.SOLVERS)
+        self.assertEqual(sum(len(g) for g in page['groups'].values()), 20)
+        with self.assertRaisesRegex(ValueError, 'No registered solver supports banana caps'):
+            select_solver('banana', 20, 4, 5)
+
+    def test_explicit_solver(self):
+        """
+        Tests that a page can pin a solver that supports its cap type.
+        """
+        page = make_page(projects=self.projects, users=ranked_users(20, self.projects),
+                         cap_type='soft', group_size=5, solver='greedy-soft')
+        assign_groups(page)
+        self.assertEqual(page['solver_run']['engine'], 'greedy-soft')
+
+    def test_pinned_solver_that_cannot_run(self):
+        """
+        Tests that a pinned solver that no longer fits the page is recorded
+        as an auto selection with the reason.
+        """
+        # 30 users cannot fit 4 soft groups of at most 5, which exact needs.
+        page = make_page(projects=self.projects, users=ranked_users(30, self.projects),
+                         cap_type='soft', group_size=5, solver='exact')
+        assign_groups(page)
+        run = page['solver_run']
+        self.assertEqual(run['mode'], 'auto')
+        self.assertEqual(run['requested'], 'exact')
+        self.assertEqual(run['override'], 'exact needs room for every user under soft caps')
+        self.assertEqual(run['engine'], 'greedy-soft')
+
+    def test_admin_rejects_unsupported_solver(self):
+        """
+        Tests that a page cannot be created with a solver for another cap type.
+        """
+        client = main.app.test_client()
+        with client.session_transaction() as session:
+            session['logged_in'] = True
+        response = client.post('/admin', data={
+            'page_name': 'Page', 'projects': 'A,B', 'cap_type': 'soft',
+            'group_size': '2', 'solver': 'greedy-hard',
+        })
+        self.assertEqual(response.status_code, 302)
+        with client.session_transaction() as session:
+            self.assertEqual(session['_flashes'], [('message', 'greedy-hard does not support soft caps')])
+
+    def test_timeout_falls_back_to_heuristic(self):
+        """
+        Tests that an exact solve past its deadline falls back to greedy.
+        """
+        budget = main.SOLVER_TIME_BUDGET
+        main.SOLVER_TIME_BUDGET = -1
+        try:
+            page = make_page(projects=self.projects, users=ranked_users(20, self.projects),
+                             cap_type='hard', group_size=5, solver='exact')
+            assign_groups(page)
+        finally:
+            main.SOLVER_TIME_BUDGET = budget
+        self.assertEqual(page['solver_run']['engine'], 'exact')
+        self.assertEqual(page['solver_run']['fallback'], 'greedy-hard')
+        self.assertEqual(sum(len(g) for g in page['groups'].values()), 20)
+
+    def test_exact_beats_greedy(self):
+        """
+        Tests that the exact solver finds a lower total rank than greedy.
+        User 1 takes A greedily, pushing User 2 to their third choice.
+        """
+        projects = ['A', 'B', 'C']
+        users = {
+            'User 1': {'A': 1, 'B': 2, 'C': 3},
+            'User 2': {'A': 1, 'B': 3, 'C': 3},
+            'User 3': {'C': 1, 'A': 2, 'B': 3},
+        }
+        groups = solve_exact(users, projects, 1)
+        self.assertEqual(groups, {'A': ['User 2'], 'B': ['User 1'], 'C': ['User 3']})
+
+class TestExactSolver(unittest.TestCase):
+    """
+    Test suite for assign_groups pinned to the exact engine.
+    """
+
+    def assign_exact(self, page):
+        page['solver'] = 'exact'
+        assign_groups(page)
+        self.assertEqual(page['solver_run']['engine'], 'exact')
+        self.assertEqual(page['solver_run']['mode'], 'exact')
+        return page['groups']
+
+    def total_rank(self, page):
+        return sum(page['users'][user][project]
+                   for project, members in page['groups'].items() for user in members)
+
+    def test_even_distribution(self):
+        """
+        Tests that rotating preferences give everyone their first choice.
+        """
+        projects = [f'Project {i}' for i in range(1, 6)]
+        page = make_page(projects=projects, users=ranked_users(50, projects),
+                         cap_type='soft', group_size=10, variation=0)
+        groups = self.assign_exact(page)
+        for project in projects:
+            self.assertEqual(len(groups[project]), 10)
+        self.assertEqual(self.total_rank(page), 50)
+
+    def test_all_users_assigned(self):
+        """
+        Tests that a soft cap with room for everyone assigns every user.
+        """
+        projects = [f'Project {i}' for i in range(1, 4)]
+        page = make_page(projects=projects, users=ranked_users(23, projects),
+                         cap_type='soft', group_size=8, variation=2)
+        groups = self.assign_exact(page)
+        assigned = [user for members in groups.values() for user in members]
+        self.assertEqual(sorted(assigned), sorted(page['users']))
+        for members in groups.values():
+            self.assertLessEqual(len(members), 10)
+
+    def test_hard_cap_impossible_constraints(self):
+        """
+        Tests that a hard cap assigns as many users as the groups can hold.
+        """
+        users = {f'User {i}': {'Project A': 1} for i in range(3)}
+        page = make_page(projects=['Project A'], users=users, cap_type='hard', group_size=2)
+        groups = self.assign_exact(page)
+        self.assertEqual(len(groups['Project A']), 2)
+
+    def test_skewed_preferences(self):
+        """
+        Tests that everyone preferring one project fills it to capacity.
+        """
+        users = {f'User {i}': {'Project A': 1, 'Project B': 2} for i in range(10)}
+        for cap_type, variation, expected in [('hard', 0, 5), ('soft', 1, 6), ('soft', 2, 7)]:
+            with self.subTest(cap_type=cap_type, variation=variation):
+                page = make_page(projects=['Project A', 'Project B'], users=users,
+                                 cap_type=cap_type, group_size=5, variation=variation)
+                groups = self.assign_exact(page)
+                self.assertEqual(len(groups['Project A']), expected)
+                self.assertEqual(len(groups['Project B']), 10 - expected)
+
+    def test_missing_preferences(self):
+        """
+        Tests that an unranked project is treated as worse than any ranked one.
+        """
+        users = {
+            'User 1': {'Project A': 1},
+            'User 2': {'Project A': 1, 'Project B': 2},
+        }
+        page = make_page(projects=['Project A', 'Project B'], users=users, group_size=1)
+        groups = self.assign_exact(page)
+        self.assertEqual(groups, {'Project A': ['User 1'], 'Project B': ['User 2']})
+
+    def test_no_worse_than_greedy(self):
+        """
+        Tests that the exact engine never has a higher total rank than greedy.
+        """
+        projects = ['A', 'B', 'C', 'D']
+        users = {f'User {i}': {p: (i * 7 + j * (i % 3 + 1)) % 4 + 1 for j, p in enumerate(projects)}
+                 for i in range(30)}
+        for cap_type in ('hard', 'soft'):
+            with self.subTest(cap_type=cap_type):
+                greedy = make_page(projects=projects, users=users, cap_type=cap_type, group_size=8,
+                                   solver=f'greedy-{cap_type}')
+                assign_groups(greedy)
+                exact = make_page(projects=projects, users=users, cap_type=cap_type, group_size=8)
+                self.assign_exact(exact)
+                self.assertLessEqual(self.total_rank(exact), self.total_rank(greedy))
+
+class TestChangeHub(StorageTestCase):
+    """
+    Test suite for the ChangeHub fan-out and the page event stream.
+    """
+
+    def test_snapshot_reads_storage_only_on_change(self):
+        """
+        Tests that the hub serves cached data until storage changes, including
+        writes that bypass this process's save_data().
+        """
+        main.write_json_atomic(main.DATA_FILE, {'page': make_page()})
+        version, data = main.change_hub.snapshot()
+        self.assertIn('page', data)
+        self.assertIs(main.change_hub.snapshot()[1], data)
+
+        interval = main.STORAGE_CHECK_INTERVAL
+        main.STORAGE_CHECK_INTERVAL = 0
+        try:
+            self.assertIs(main.change_hub.snapshot()[1], data)
+            main.write_json_atomic(main.DATA_FILE, {})
+            new_version, new_data = main.change_hub.snapshot()
+        finally:
+            main.STORAGE_CHECK_INTERVAL = interval
+        self.assertNotEqual(new_version, version)
+        self.assertEqual(new_data, {})
+
+    def test_wait_sees_external_writes(self):
+        """
+        Tests that a waiting watcher wakes for a write made by another process.
+        """
+        main.write_json_atomic(main.DATA_FILE, {})
+        version, _ = main.change_hub.snapshot()
+        interval = main.STORAGE_CHECK_INTERVAL
+        main.STORAGE_CHECK_INTERVAL = 0.01
+        try:
+            timer = threading.Timer(0.05, main.write_json_atomic, (main.DATA_FILE, {'page': make_page()}))
+            timer.start()
+            new_version, data = main.change_hub.wait(version, timeout=5)
+            timer.join()
+        finally:
+            main.STORAGE_CHECK_INTERVAL = interval
+        self.assertNotEqual(new_version, version)
+        self.assertIn('page', data)
+
+    def test_save_wakes_all_watchers(self):
+        """
+        Tests that a single save_data() notifies every waiting watcher.
+        """
+        version, _ = main.change_hub.snapshot()
+        seen = []
+        watchers = [
+            threading.Thread(target=lambda: seen.append(main.change_hub.wait(version, timeout=5)))
+            for _ in range(3)
+        ]
+        for watcher in watchers:
+            watcher.start()
+        main.save_data({'page': make_page(users={'User 1': {'Project A': 1}})})
+        for watcher in watchers:
+            watcher.join()
+
+        self.assertEqual(len(seen), 3)
+        for new_version, data in seen:
+            self.assertNotEqual(new_version, version)
+            self.assertEqual(len(data['page']['users']), 1)
+
+    def test_wait_times_out_without_change(self):
+        """
+        Tests that wait() returns the unchanged version after the timeout.
+        """
+        version, _ = main.change_hub.snapshot()
+        self.assertEqual(main.change_hub.wait(version, timeout=0.01)[0], version)
+
+    def test_events_stream(self):
+        """
+        Tests that the event stream pushes count and closed-state changes.
+        """
+        main.save_data({'page': make_page()})
+        client = main.app.test_client()
+        self.assertEqual(client.get('/missing/events').status_code, 404)
+
+        response = client.get('/page/events', buffered=False)
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        stream = (chunk.decode() for chunk in response.response)
+        self.assertEqual(next(stream), f'retry: {main.EVENTS_RETRY_MS}\n\n')
+        self.assertIn('"count": 0, "closed": false', next(stream))
+
+        main.save_data({'page': make_page(users={'User 1': {'Project A': 1}}, closed=True)})
+        self.assertIn('"count": 1, "closed": true', next(stream))
+
+        main.save_data({})
+        self.assertTrue(next(stream).startswith('event: deleted'))
+        response.close()
+
+    def test_events_stream_resumes_and_ends(self):
+        """
+        Tests that a reconnect with an up-to-date Last-Event-ID gets no repeated
+        state, and that streams end after EVENTS_STREAM_SECONDS.
+        """
+        main.save_data({'page': make_page()})
+        version, _ = main.change_hub.snapshot()
+        stream_seconds = main.EVENTS_STREAM_SECONDS
+        main.EVENTS_STREAM_SECONDS = 0.05
+        try:
+            client = main.app.test_client()
+            response = client.get('/page/events', headers={'Last-Event-ID': version})
+            body = response.get_data(as_text=True)
+        finally:
+            main.EVENTS_STREAM_SECONDS = stream_seconds
+        self.assertEqual(body, f'retry: {main.EVENTS_RETRY_MS}\n\n: keepalive\n\n: keepalive\n\n')
+
+class TestSnapshots(StorageTestCase):
+    """
+    Test suite for atomic saves and point-in-time snapshots.
+    """
+
+    def test_save_is_atomic(self):
+        """
+        Tests that save_data() replaces the file and leaves no temp files behind.
+        """
+        with open(main.DATA_FILE, 'w') as f:
+            f.write('{}')
+        with open(main.DATA_FILE, 'r') as reader:
+            main.save_data({'a': make_page('A')})
+            # An already open reader keeps seeing the complete old file.
+            self.assertEqual(json.load(reader), {})
+        self.assertEqual(main.get_data(), {'a': make_page('A')})
+        self.assertEqual(os.listdir(self.tmpdir.name), ['data.json'])
+
+    def test_migrate_legacy_data(self):
+        """
+        Tests that a legacy data file is copied to a missing DATA_FILE and
+        never overwrites an existing one.
+        """
+        main.DATA_FILE = os.path.join(self.tmpdir.name, 'data', 'data.json')
+        with open(main.LEGACY_DATA_FILE, 'w') as f:
+            json.dump({'a': make_page('A')}, f)
+        main.migrate_legacy_data()
+        self.assertEqual(main.get_data(), {'a': make_page('A')})
+
+        main.save_data({})
+        main.migrate_legacy_data()
+        self.assertEqual(main.get_data(), {})
+
+    def test_incremental_snapshots(self):
+        """
+        Tests that later snapshots only store changed and deleted pages.
+        """
+        main.save_data({'a': make_page('A'), 'b': make_page('B')})
+        first = main.create_snapshot()
+        self.assertEqual(first['version'], 1)
+        self.assertIsNone(first['base'])
+        self.assertEqual(set(first['pages']), {'a', 'b'})
+
+        data = main.get_data()
+        data['a']['users']['User 1'] = {'Project A': 1}
+        del data['b']
+        data['c'] = make_page('C')
+        main.save_data(data)
+        second = main.create_snapshot()
+        self.assertEqual(second['base'], 1)
+        self.assertEqual(set(second['pages']), {'a', 'c'})
+        self.assertEqual(second['deleted'], ['b'])
+
+        third = main.create_snapshot()
+        self.assertEqual(third['pages'], {})
+
+        full = main.create_snapshot(full=True)
+        self.assertIsNone(full['base'])
+        self.assertEqual(set(full['pages']), {'a', 'c'})
+
+    def test_concurrent_snapshots(self):
+        """
+        Tests that concurrent snapshots get distinct versions.
+        """
+        main.save_data({'a': make_page('A')})
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(main.create_snapshot())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(r['version'] for r in results), list(range(1, 9)))
+        self.assertEqual(main.list_snapshots(), list(range(1, 9)))
+        for result in results:
+            self.assertEqual(main.load_snapshot(result['version']), result)
+
+    def test_snapshot_waits_for_lock(self):
+        """
+        Tests that a snapshot polls for the lock held by another process and
+        runs once it is released.
+        """
+        main.save_data({'a': make_page('A')})
+        os.makedirs(main.SNAPSHOT_DIR)
+        with open(os.path.join(main.SNAPSHOT_DIR, '.lock'), 'w') as holder:
+            fcntl.flock(holder, fcntl.LOCK_EX)
+            results = []
+            thread = threading.Thread(target=lambda: results.append(main.create_snapshot()))
+            thread.start()
+            thread.join(0.2)
+            self.assertTrue(thread.is_alive())
+            fcntl.flock(holder, fcntl.LOCK_UN)
+            thread.join(5)
+        self.assertEqual(results[0]['version'], 1)
+
+    def test_snapshot_skips_unreadable_files(self):
+        """
+        Tests that empty or damaged snapshot files are neither overwritten nor
+        used as a base, and that no temp files are left behind.
+        """
+        main.save_data({'a': make_page('A')})
+        main.create_snapshot()
+        open(main.snapshot_path(2), 'w').close()
+        with open(main.snapshot_path(3), 'w') as f:
+            f.write('{')
+
+        self.assertEqual(main.list_snapshots(), [1, 3])
+        snapshot = main.create_snapshot()
+        self.assertEqual(snapshot['version'], 4)
+        self.assertEqual(snapshot['base'], 1)
+        self.assertEqual(main.load_snapshot(4), snapshot)
+        self.assertEqual(os.path.getsize(main.snapshot_path(2)), 0)
+        self.assertEqual(sorted(os.listdir(main.SNAPSHOT_DIR)),
+                         ['.lock'] + [os.path.basename(main.snapshot_path(v)) for v in range(1, 5)])
+
+    def test_restore_snapshot(self):
+        """
+        Tests that restoring replays the snapshot chain up to the given version.
+        """
+        main.save_data({'a': make_page('A'), 'b': make_page('B')})
+        main.create_snapshot()
+        data = main.get_data()
+        data['a']['closed'] = True
+        del data['b']
+        main.save_data(data)
+        main.create_snapshot()
+        main.save_data({})
+
+        main.restore_snapshot(1)
+        self.assertEqual(main.get_data(), {'a': make_page('A'), 'b': make_page('B')})
+        main.restore_snapshot(2)
+        self.assertEqual(main.get_data(), {'a': dict(make_page('A'), closed=True)})
+        self.assertEqual(main.change_hub.snapshot()[1], main.get_data())
+
+    def test_cli_commands(self):
+        """
+        Tests the snapshot and restore CLI commands.
+        """
+        main.save_data({'a': make_page('A')})
+        runner = main.app.test_cli_runner()
+        result = runner.invoke(args=['snapshot'])
+        self.assertIn('Snapshot 1 saved', result.output)
+
+        main.save_data({})
+        result = runner.invoke(args=['restore'])
+        self.assertIn('Restored 1 page(s) from snapshot 1', result.output)
+        self.assertEqual(main.get_data(), {'a': make_page('A')})
+
+        result = runner.invoke(args=['restore', '7'])
+        self.assertNotEqual(result.exit_code, 0)
+
+        runner.invoke(args=['snapshot'])
+        os.remove(main.snapshot_path(1))
+        result = runner.invoke(args=['restore', '2'])
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn('Snapshot 1 is missing; snapshot 2 builds on it', result.output)
+
+    def test_admin_snapshot(self):
+        """
+        Tests that the admin snapshot button runs the snapshot command and
+        honours the full checkbox.
+        """
+        main.save_data({'a': make_page('A')})
+        client = main.app.test_client()
+        with client.session_transaction() as session:
+            session['logged_in'] = True
+        client.post('/admin/snapshot')
+        client.post('/admin/snapshot', data={'full': '1'})
+        with client.session_transaction() as session:
+            self.assertEqual([message for _, message in session['_flashes']], [
+                'Snapshot 1 saved with 1 changed page(s) and 0 deleted page(s)',
+                'Snapshot 2 saved with 1 changed page(s) and 0 deleted page(s)',
+            ])
+        self.assertEqual(main.load_snapshot(1)['base'], None)
+        self.assertEqual(main.load_snapshot(2)['base'], None)
+        self.assertEqual(main.load_snapshot(2)['pages'], {'a': make_page('A')})
+
 if __name__ == '__main__':
     unittest.main()